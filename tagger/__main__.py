@@ -5,50 +5,64 @@ import argparse
 from tagger import FileTagger
 
 
+def positive_int(value):
+    res = int(value)
+    if res < 1:
+        raise argparse.ArgumentTypeError("{} is not a positive integer".format(value))
+    return res
+
+
+def get_tagger(args):
+    return FileTagger(identity=args.identity, queue_size=args.queue_size)
+
+
 def tagger_add(args):
-    tg = FileTagger()
+    tg = get_tagger(args)
     res = tg.add_tags(args.path, *args.tags)
     if not res:
         print("[-] Fail to add tags.")
 
 
 def tagger_rm(args):
-    tg = FileTagger()
+    tg = get_tagger(args)
     res = tg.rm_tags(args.path, *args.tags)
     if not res:
         print("[-] Fail to remove tags.")
 
 
 def tagger_find(args):
-    tg = FileTagger()
+    tg = get_tagger(args)
     found = tg.find_tags(args.path, *args.tags, top_only=args.top, depth=args.depth)
     print('\n'.join(found))
 
 
 def tagger_get(args):
-    tg = FileTagger()
+    tg = get_tagger(args)
     tags = tg.get_tags(args.path)
     print('\n'.join(tags))
 
 
 def tagger_clear(args):
-    tg = FileTagger()
+    tg = get_tagger(args)
     res = tg.clear_tags(args.path, recursive=args.recursive, depth=args.depth, top_only=args.top)
     if not res:
         print("[-] Fail to clear tags")
 
 
 def tagger_merge(args):
-    tg = FileTagger()
-    tg.merge_tags(args.path, args.dest_path, *args.tags)
+    tg = get_tagger(args)
+    tg.merge_tags(args.path, args.dest_path, *args.tags, dedup=args.dedup)
 
 
 def tagger_sync(args):
-    tg = FileTagger()
-    tg.sync_tags(args.path, recursive=args.recursive, depth=args.depth, top_only=args.top)
+    tg = get_tagger(args)
+    tg.sync_tags(args.path, recursive=args.recursive, depth=args.depth, top_only=args.top,
+                 forget_moved=args.forget_moved)
 
 def get_parser():
     parser = argparse.ArgumentParser(prog="tagger")
+    parser.add_argument("-i", "--identity", help="track tags by inode and content so that they survive moves", action="store_true")
+    parser.add_argument("-q", "--queue-size", type=positive_int, help="max entries of traversal queue kept in memory, the rest is spilled to disk")
     subparsers = parser.add_subparsers()
     # tagger add
     parser_add = subparsers.add_parser("add", help="add tags to path")
@@ -84,6 +98,7 @@ def get_parser():
     parser_merge.add_argument(
         "dest_path", help="dest directory to save copy of files")
     parser_merge.add_argument("tags", nargs="+", help="tags to merge")
+    parser_merge.add_argument("-u", "--dedup", help="skip files whose content already exists in dest_path", action="store_true")
     parser_merge.set_defaults(func=tagger_merge)
     # tagger sync
     parser_sync = subparsers.add_parser("sync", help="synchronize tags, remove tags of non-existent files")
@@ -91,6 +106,7 @@ def get_parser():
     parser_sync.add_argument("-r", '--recursive', help='recursively sync tags', action='store_true')
     parser_sync.add_argument('-t', '--top', help='sync only top files or folders', action='store_true')
     parser_sync.add_argument('-d', '--depth', type=int, help='depth to sync')
+    parser_sync.add_argument('-f', '--forget-moved', help='forget tags of moved files not looked up yet, valid if -i is given', action='store_true')
     parser_sync.set_defaults(func=tagger_sync)
     return parser
 
@@ -7,12 +7,107 @@ import logging
 import json
 import time
 import shutil
-from collections import deque
+import stat
+import hashlib
+import struct
+import tempfile
+from collections import deque, OrderedDict
 
 logger = logging.getLogger(__name__)
 
 
+class _PathQueue(object):
+    '''FIFO queue of paths stored as parent and name. consecutive paths of the same parent
+    share one parent record. records beyond max_size are spilled to a temporary file,
+    so memory is bounded however wide the tree is.
+    '''
+    _HEADER = struct.Struct('>?I')
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        # parent records are tuple(parent,), name records are plain str
+        self._head = deque()
+        self._head_parent = None
+        self._tail_parent = None
+        self._spill = None
+        self._spilled = 0
+        self._read_pos = 0
+        self._write_pos = 0
+        self._reading = False
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, parent, name):
+        if parent is not self._tail_parent and parent != self._tail_parent:
+            self._push((parent,))
+            self._tail_parent = parent
+        self._push(name)
+        self._len += 1
+
+    def popleft(self):
+        while True:
+            if not self._head:
+                self._refill()
+            record = self._head.popleft()
+            if type(record) is tuple:
+                self._head_parent = record[0]
+                continue
+            self._len -= 1
+            return os.path.join(self._head_parent, record)
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _push(self, record):
+        if not self._spilled and len(self._head) < self.max_size:
+            self._head.append(record)
+            return
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+        if self._reading:
+            self._spill.seek(self._write_pos)
+            self._reading = False
+        is_parent = type(record) is tuple
+        data = os.fsencode(record[0] if is_parent else record)
+        self._spill.write(self._HEADER.pack(is_parent, len(data)))
+        self._spill.write(data)
+        self._write_pos += self._HEADER.size + len(data)
+        self._spilled += 1
+
+    def _refill(self):
+        self._spill.seek(self._read_pos)
+        self._reading = True
+        for _ in range(min(self.max_size, self._spilled)):
+            is_parent, size = self._HEADER.unpack(self._spill.read(self._HEADER.size))
+            value = os.fsdecode(self._spill.read(size))
+            self._head.append((value,) if is_parent else value)
+            self._spilled -= 1
+        self._read_pos = self._spill.tell()
+        if not self._spilled:
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._read_pos = self._write_pos = 0
+
+
 class Tagger(abc.ABC):
+    HASH_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, queue_size=None):
+        '''
+        Args:
+            queue_size(int): max number of entries of each traversal queue kept in memory.
+                the rest is spilled to temporary files. None keeps all entries in memory
+        '''
+        if queue_size is not None and queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.queue_size = queue_size
+        # (st_dev, st_ino, st_size, st_mtime_ns) => content hash
+        self._hash_cache = {}
+
     def add_tags(self, path, *tags, **kwargs):
         '''add tags to path
         Args:
@@ -129,8 +224,12 @@ class Tagger(abc.ABC):
             path(str): path to search for tags
             dest_path(str): path to store found files
             *tags(str): tags to search for
+            **kwargs:
+                dedup(boolean): don't copy files whose content already exists in dest_path,
+                    add tags to the existing file instead
         Return(boolean): return True if succeed.
         '''
+        dedup = kwargs.pop('dedup', False)
         # merge single file is meaningless
         if not os.path.isdir(path):
             return False
@@ -144,7 +243,14 @@ class Tagger(abc.ABC):
             except:
                 return False
         paths = self.find_tags(path, *tags, top_only=True, **kwargs)
+        dest_files = self._files_by_size(dest_path) if dedup else {}
         for p in paths:
+            if dedup and os.path.isfile(p):
+                dup = self._find_dup_file(p, dest_files)
+                if dup:
+                    logger.info("[*] {} already exists as {}, skip copying".format(p, dup))
+                    self.add_tags(dup, *self.get_tags(p))
+                    continue
             target = os.path.join(dest_path, os.path.basename(p))
             target = self._handle_dup_path(p, target)
             try:
@@ -153,6 +259,8 @@ class Tagger(abc.ABC):
                 else:
                     shutil.copy2(p, target)
                     self.add_tags(target, *self.get_tags(p))
+                    if dedup:
+                        dest_files.setdefault(os.path.getsize(target), []).append(target)
             except:
                 logger.warn("[!] Fail to copy {} to {}".format(p, target))
         self.add_tags(dest_path, *tags)
@@ -176,6 +284,12 @@ class Tagger(abc.ABC):
         Return(corouting): every time return a possible path, formatted as tuple(path, is_dir) then receive 
             a boolean value specific whether to continue under that path.
         '''
+        if self.queue_size is None:
+            return self._bfs_tagged_paths(root, depth)
+        return self._bounded_bfs_tagged_paths(root, depth)
+
+    def _bfs_tagged_paths(self, root, depth):
+        '''_possible_tagged_paths keeping whole levels in memory'''
         curr_depth = 0
         roots = deque([root])
         tmp_roots = deque()
@@ -188,29 +302,88 @@ class Tagger(abc.ABC):
                     if not stop:
                         tmp_roots.appendleft(top)
                 else:
-                    # only search sub dirs
-                    scandir_it = os.scandir(top)
-                    sub_roots.extendleft(map(lambda entry: entry.path, filter(
-                        lambda entry: entry.is_dir(), scandir_it)))
+                    # only search sub dirs, and files known elsewhere
+                    with os.scandir(top) as scandir_it:
+                        for entry in scandir_it:
+                            listed = self._listed_entry(top, entry)
+                            if entry.is_dir():
+                                sub_roots.appendleft(entry.path)
+                            elif listed and curr_depth != depth:
+                                _ = yield entry.path, False
             if curr_depth == depth:
                 break
             roots = sub_roots
             while len(tmp_roots):
                 top = tmp_roots.pop()
-                scandir_it = os.scandir(top)
-                for entry in scandir_it:
-                    if entry.is_dir():
-                        roots.appendleft(entry.path)
-                    else:
-                        _ = yield entry.path, False
+                with os.scandir(top) as scandir_it:
+                    for entry in scandir_it:
+                        self._listed_entry(top, entry)
+                        if entry.is_dir():
+                            roots.appendleft(entry.path)
+                        else:
+                            _ = yield entry.path, False
             curr_depth += 1
 
+    def _bounded_bfs_tagged_paths(self, root, depth):
+        '''_possible_tagged_paths keeping at most queue_size entries of each queue in memory'''
+        curr_depth = 0
+        roots = _PathQueue(self.queue_size)
+        roots.append('', root)
+        sub_roots = tmp_roots = None
+        try:
+            while len(roots):
+                sub_roots = _PathQueue(self.queue_size)
+                tmp_roots = _PathQueue(self.queue_size)
+                while len(roots):
+                    top = roots.popleft()
+                    if self._possible_has_tag_entry(top):
+                        stop = yield top, True
+                        if not stop:
+                            tmp_roots.append(*os.path.split(top))
+                    else:
+                        # only search sub dirs, and files known elsewhere
+                        with os.scandir(top) as scandir_it:
+                            for entry in scandir_it:
+                                listed = self._listed_entry(top, entry)
+                                if entry.is_dir():
+                                    sub_roots.append(top, entry.name)
+                                elif listed and curr_depth != depth:
+                                    _ = yield entry.path, False
+                roots.close()
+                if curr_depth == depth:
+                    break
+                roots = sub_roots
+                while len(tmp_roots):
+                    top = tmp_roots.popleft()
+                    with os.scandir(top) as scandir_it:
+                        for entry in scandir_it:
+                            self._listed_entry(top, entry)
+                            if entry.is_dir():
+                                roots.append(top, entry.name)
+                            else:
+                                _ = yield entry.path, False
+                tmp_roots.close()
+                curr_depth += 1
+        finally:
+            for queue in (roots, sub_roots, tmp_roots):
+                if queue is not None:
+                    queue.close()
+
     def _possible_has_tag_entry(self, directory, recursive=False):
         '''whether directory or file under directory possible has tag. this is for speed improvement
         directory must exist
         '''
         return True
 
+    def _listed_entry(self, directory, entry):
+        '''called for every entry the traversal lists.
+        Args:
+            directory(str): directory being listed
+            entry(os.DirEntry): entry under directory
+        Return(boolean): whether entry possibly has tag although directory has no tag entry
+        '''
+        return False
+
     def _find_tags_top_only(self, path, *tags, **kwargs):
         '''path must exist'''
         paths = []
@@ -261,30 +434,147 @@ class Tagger(abc.ABC):
             logger.info("[*] {} duplicate, rename to {}".format(path, target))
         return target
 
+    def _content_hash(self, path, st=None):
+        '''get sha256 of file content. result is cached until file is modified
+        Args:
+            path(str): path of regular file
+            st(os.stat_result): stat of path if already known
+        Return(str): hex digest
+        '''
+        if st is None:
+            st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        digest = self._hash_cache.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._hash_cache[key] = digest
+        return digest
+
+    def _files_by_size(self, directory):
+        '''group regular files directly under directory by size'''
+        files = {}
+        with os.scandir(directory) as scandir_it:
+            for entry in scandir_it:
+                if entry.is_file():
+                    files.setdefault(entry.stat().st_size, []).append(entry.path)
+        return files
+
+    def _find_dup_file(self, path, files):
+        '''find file that has the same content as path
+        Args:
+            path(str): path of regular file
+            files(dict): files grouped by size, see _files_by_size
+        Return(str): path of duplicated file or None. only files of the same size are hashed
+        '''
+        st = os.stat(path)
+        candidates = files.get(st.st_size)
+        if not candidates:
+            return None
+        digest = self._content_hash(path, st)
+        for candidate in candidates:
+            if self._content_hash(candidate) == digest:
+                return candidate
+        return None
+
 
 class FileTagger(Tagger):
     TAG_FILE = '.tag'
+    INDEX_FILE = '.tagger_index'
+    INDEX_COMPACT_SIZE = 1024
+    # mtime kept by tools moving files across file systems may be rounded (FAT)
+    MTIME_RESOLUTION_NS = 2 * 10**9
+    # file timestamps may be this coarse (FAT), so changes within it can't be told by stat
+    QUERY_RACY_NS = 2 * 10**9
+
+    def __init__(self, identity=False, index_path=None, query_cache_size=0, queue_size=None):
+        '''
+        Args:
+            identity(boolean): also key tags by (st_dev, st_ino), with size, mtime and content
+                hash of files as fallback, so that tags survive moves and renames. reading tags
+                of a moved path rebinds them in the index. find_tags finds paths moved on the
+                same file system; paths moved across file systems are only found by get_tags
+            index_path(str): path of persistent identity index. valid only if identity is True.
+                default is ~/.tagger_index
+            query_cache_size(int): max number of find_tags results to cache. 0 disables caching
+            queue_size(int): see Tagger
+        '''
+        super().__init__(queue_size=queue_size)
+        self.identity = identity
+        if index_path is None:
+            index_path = os.path.join(os.path.expanduser('~'), self.INDEX_FILE)
+        self.index_path = os.path.abspath(index_path)
+        self.__index = None
+        # size => keys of file entries
+        self.__index_sizes = None
+        # state of the running traversal in identity mode
+        self.__walk_root = None
+        self.__walk_hits = None
+        self.__walk_dev = None
+        self.__journal_len = 0
+        # stat key of index file as last loaded or written by this instance. False if unknown
+        self.__index_stat = None
+        self.query_cache_size = query_cache_size
+        # (root, tags, top_only, depth) => (paths, {path: stat key or None})
+        self.__query_cache = OrderedDict()
+        # dependencies of the running find_tags query
+        self.__query_deps = None
+        # number of tag file and index writes, to tell whether a query wrote files
+        self.__write_count = 0
+
+    def find_tags(self, path, *tags, **kwargs):
+        '''same as Tagger.find_tags. if query_cache_size is set, results are cached and
+        revalidated by stat-ing only the directories and tag files the query depended on
+        '''
+        if self.identity:
+            self.__refresh_index()
+        if not self.query_cache_size:
+            return super().find_tags(path, *tags, **kwargs)
+        _path = os.path.abspath(path)
+        key = (_path, frozenset(tags), bool(kwargs.get('top_only')), kwargs.get('depth'))
+        cached = self.__query_cache.get(key)
+        if cached is not None:
+            paths, deps = cached
+            if all(self.__stat_dep(p) == v for p, v in deps.items()):
+                self.__query_cache.move_to_end(key)
+                return list(paths)
+            self.__query_cache.pop(key)
+        # creation or deletion of path changes its parent directory
+        self.__query_deps = {}
+        self.__add_query_dep(os.path.dirname(_path))
+        write_count = self.__write_count
+        try:
+            paths = super().find_tags(path, *tags, **kwargs)
+            deps = self.__query_deps
+        finally:
+            self.__query_deps = None
+        if self.identity:
+            deps[self.index_path] = self.__stat_dep(self.index_path)
+        # a query that changed its own dependencies or depends on racily clean files isn't cached
+        if write_count != self.__write_count or False in deps.values():
+            return paths
+        self.__query_cache[key] = (list(paths), deps)
+        while len(self.__query_cache) > self.query_cache_size:
+            self.__query_cache.popitem(last=False)
+        return paths
 
     def sync_tags(self, path, **kwargs):
+        '''same as Tagger.sync_tags. in identity mode, index entries of replaced paths under path
+        are dropped too
+        Args:
+            **kwargs:
+                forget_moved(boolean): in identity mode, also drop index entries of paths under
+                    path that no longer exist, i.e. forget tags of moved files not looked up yet
+        '''
         if not os.path.exists(path):
             return False
-        recursive = kwargs.get('recursive')
-        if recursive:
-            top_only = kwargs.get('top_only')
-            depth = kwargs.get('depth')
-            if not depth:
-                depth = -1
-            for entry in os.scandir(path):
-                if entry.is_dir():
-                    if top_only:
-                        self.sync_tags(entry.path, recursive=False)
-                    else:
-                        self.sync_tags(
-                            entry.path, recursive=True, depth=depth-1)
-                else:
-                    self.__sync_tags_one(path)
-        else:
-            self.__sync_tags_one(path)
+        self.__sync_tags_tree(path, **kwargs)
+        if self.identity:
+            self.__sync_index(path, forget_moved=kwargs.get('forget_moved'))
+        return True
 
     def _read_tags(self, path):
         _path = os.path.abspath(path)
@@ -292,6 +582,8 @@ class FileTagger(Tagger):
         tags = meta.get(_path)
         if tags:
             return tags
+        elif self.identity:
+            return self.__read_identity_tags(_path)
         else:
             return []
 
@@ -303,15 +595,47 @@ class FileTagger(Tagger):
                 meta.pop(_path)
         else:
             meta[_path] = list(set(tags))
+        if self.identity:
+            self.__write_identity_tags(_path, tags)
         return self.__write_tag_meta(path, meta)
 
     def _possible_has_tag_entry(self, directory, recursive=False):
-        return os.path.exists(self.__get_tag_file(os.path.abspath(directory)))
+        directory = os.path.abspath(directory)
+        # every directory is checked before being listed
+        self.__add_query_dep(directory)
+        return os.path.exists(self.__get_tag_file(directory))
+
+    def _possible_tagged_paths(self, root, depth=None):
+        if not self.identity:
+            return super()._possible_tagged_paths(root, depth=depth)
+        return self.__identity_walk(root, depth)
+
+    def _listed_entry(self, directory, entry):
+        # files moved into directory are only known by the index
+        if self.__walk_root is None or not self.__index or entry.name == self.TAG_FILE:
+            return False
+        if self.__walk_dev is None or self.__walk_dev[0] != directory:
+            self.__walk_dev = (directory, os.stat(directory).st_dev)
+        if "{}:{}".format(self.__walk_dev[1], entry.inode()) not in self.__index:
+            return False
+        self.__walk_hits.add(os.path.abspath(entry.path))
+        return True
+
+    def __identity_walk(self, root, depth):
+        '''traverse with identity lookups limited to listed inodes found in the index'''
+        self.__refresh_index()
+        self.__walk_root = os.path.abspath(root)
+        self.__walk_hits = set()
+        try:
+            return (yield from super()._possible_tagged_paths(root, depth=depth))
+        finally:
+            self.__walk_root = self.__walk_hits = self.__walk_dev = None
 
     def __read_tag_meta(self, path):
         tag_file = self.__get_tag_file(path)
         if not tag_file:
             return {}
+        self.__add_query_dep(tag_file)
         try:
             with open(tag_file, "r", encoding='utf-8') as f:
                 meta = json.load(f)
@@ -321,6 +645,7 @@ class FileTagger(Tagger):
 
     def __write_tag_meta(self, path, meta):
         tag_file = self.__get_tag_file(path)
+        self.__write_count += 1
         if not meta:
             if not os.path.exists(tag_file):
                 return True
@@ -343,6 +668,26 @@ class FileTagger(Tagger):
         tag_file = os.path.join(abspath, self.TAG_FILE)
         return tag_file
 
+    def __sync_tags_tree(self, path, **kwargs):
+        recursive = kwargs.get('recursive')
+        if recursive:
+            top_only = kwargs.get('top_only')
+            depth = kwargs.get('depth')
+            if not depth:
+                depth = -1
+            with os.scandir(path) as scandir_it:
+                for entry in scandir_it:
+                    if entry.is_dir():
+                        if top_only:
+                            self.__sync_tags_tree(entry.path, recursive=False)
+                        else:
+                            self.__sync_tags_tree(
+                                entry.path, recursive=True, depth=depth-1)
+                    else:
+                        self.__sync_tags_one(path)
+        else:
+            self.__sync_tags_one(path)
+
     def __sync_tags_one(self, path):
         meta = self.__read_tag_meta(path)
         dangler_paths = []
@@ -353,10 +698,276 @@ class FileTagger(Tagger):
             meta.pop(_path)
         self.__write_tag_meta(path, meta)
 
+    def __stat_dep(self, path):
+        '''stat key of a query dependency. None if path doesn't exist, False if path changed too
+        recently for its timestamps to tell a later change (racily clean)
+        '''
+        now = int(time.time() * 10**9)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if max(st.st_mtime_ns, st.st_ctime_ns) >= now - self.QUERY_RACY_NS:
+            return False
+        return st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+    def __add_query_dep(self, path):
+        '''record path the running query depends on. must be called before path is read'''
+        if self.__query_deps is not None and path not in self.__query_deps:
+            self.__query_deps[path] = self.__stat_dep(path)
+
+    def __identity_key(self, st):
+        return "{}:{}".format(st.st_dev, st.st_ino)
+
+    def __load_index(self):
+        '''load identity index as {"dev:ino": {"path": abspath, "tags": [...], "tagged": int,
+        "size": int, "mtime": int, "hash": str}}. tagged is the time entry was created in ns.
+        size and mtime only exist for regular files, hash only for files whose size and mtime
+        collide with another file. the index file is a journal of json lines
+        {"key": "dev:ino", "entry": entry}, where a null entry removes key.
+        '''
+        if self.__index is None:
+            # stat before reading, so that changes during reading are reloaded later
+            self.__index_stat = self.__stat_index()
+            self.__index = {}
+            self.__index_sizes = {}
+            self.__journal_len = 0
+            try:
+                with open(self.index_path, "r", encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # torn write
+                            continue
+                        if not self.__is_index_record(record):
+                            continue
+                        self.__journal_len += 1
+                        self.__set_identity_entry(record["key"], record["entry"], save=False)
+            except OSError:
+                pass
+        return self.__index
+
+    def __is_index_record(self, record):
+        '''whether record read from the index journal is well formed'''
+        if not isinstance(record, dict) or not isinstance(record.get("key"), str):
+            return False
+        entry = record.get("entry")
+        if entry is None:
+            return True
+        if (not isinstance(entry, dict) or not isinstance(entry.get("path"), str)
+                or not isinstance(entry.get("tags"), list)):
+            return False
+        if "size" in entry or "mtime" in entry:
+            return isinstance(entry.get("size"), int) and isinstance(entry.get("mtime"), int)
+        return True
+
+    def __set_identity_entry(self, key, entry, save=True):
+        '''set or remove (if entry is None) entry of key, and append it to the journal'''
+        old_entry = self.__index.pop(key, None)
+        if old_entry and "size" in old_entry:
+            keys = self.__index_sizes[old_entry["size"]]
+            keys.discard(key)
+            if not keys:
+                self.__index_sizes.pop(old_entry["size"])
+        if entry:
+            self.__index[key] = entry
+            if "size" in entry:
+                self.__index_sizes.setdefault(entry["size"], set()).add(key)
+        if not save:
+            return True
+        self.__write_count += 1
+        self.__journal_len += 1
+        if self.__journal_len > 2 * len(self.__index) + self.INDEX_COMPACT_SIZE:
+            return self.__compact_index()
+        try:
+            line = json.dumps({"key": key, "entry": entry}) + "\n"
+            with open(self.index_path, "a", encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                st = os.fstat(f.fileno())
+            # the index is still up to date only if nobody else wrote to it
+            old_ino, old_size = self.__index_stat[:2] if self.__index_stat else (st.st_ino, 0)
+            if self.__index_stat is not False and old_ino == st.st_ino \
+                    and old_size + len(line.encode('utf-8')) == st.st_size:
+                self.__index_stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+            else:
+                self.__index_stat = False
+            return True
+        except:
+            logger.warning("[!] Fail to save identity index {}".format(self.index_path))
+            return False
+
+    def __stat_index(self):
+        try:
+            st = os.stat(self.index_path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def __refresh_index(self):
+        '''reload index if it's changed by another process'''
+        if self.__index is not None and self.__stat_index() != self.__index_stat:
+            self.__index = None
+        return self.__load_index()
+
+    def __compact_index(self):
+        '''rewrite journal with only live entries'''
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w+", encoding='utf-8') as f:
+                for key, entry in self.__index.items():
+                    f.write(json.dumps({"key": key, "entry": entry}) + "\n")
+            os.replace(tmp_path, self.index_path)
+            self.__journal_len = len(self.__index)
+            self.__index_stat = self.__stat_index()
+            return True
+        except:
+            logger.warning("[!] Fail to save identity index {}".format(self.index_path))
+            return False
+
+    def __sync_index(self, path, forget_moved=False):
+        '''drop index entries of path and paths under it that can't be bound any more'''
+        root = os.path.abspath(path)
+        prefix = os.path.join(root, '')
+        index = self.__load_index()
+        for key, entry in list(index.items()):
+            if entry["path"] != root and not entry["path"].startswith(prefix):
+                continue
+            try:
+                st = os.stat(entry["path"])
+            except OSError:
+                if forget_moved:
+                    self.__set_identity_entry(key, None)
+                continue
+            # path is replaced, e.g. by atomic save
+            if self.__identity_key(st) != key:
+                self.__set_identity_entry(key, None)
+
+    def __read_identity_tags(self, abspath):
+        '''find tags of moved path by inode, then by size, mtime and content hash. found tags
+        are rebound to abspath in the index only, tag files are not written. while traversing,
+        only inodes the traversal listed are looked up
+        '''
+        walking = self.__walk_root is not None and abspath != self.__walk_root
+        if walking and abspath not in self.__walk_hits:
+            return []
+        # tag files may reuse inodes of tagged files but are never tagged
+        if os.path.basename(abspath) == self.TAG_FILE:
+            return []
+        try:
+            st = os.stat(abspath)
+        except OSError:
+            return []
+        index = self.__load_index()
+        key = found_key = self.__identity_key(st)
+        entry = index.get(key)
+        if entry is not None:
+            if entry["path"] == abspath:
+                # already rebound
+                return list(entry["tags"])
+            if not self.__is_moved_entry(entry, abspath, st):
+                return []
+        elif not walking and stat.S_ISREG(st.st_mode):
+            # inode changes when moving across file systems
+            found_key = self.__find_copied_entry(abspath, st)
+            if found_key is None:
+                return []
+            entry = index[found_key]
+        else:
+            return []
+        logger.info("[*] {} moved to {}, rebind tags".format(entry["path"], abspath))
+        if found_key != key:
+            self.__set_identity_entry(found_key, None)
+        self.__set_identity_entry(key, dict(entry, path=abspath))
+        return list(entry["tags"])
+
+    def __is_moved_entry(self, entry, abspath, st):
+        '''whether index entry of another path with the same inode may be bound to abspath.
+        inode numbers are reused, so the old path must be gone, the file type must be the same
+        and abspath must not be created after the entry, where the platform records that
+        '''
+        if os.path.exists(entry["path"]):
+            return False
+        if "size" in entry:
+            same_type = stat.S_ISREG(st.st_mode)
+        else:
+            same_type = stat.S_ISDIR(st.st_mode)
+        birthtime = getattr(st, "st_birthtime", None)
+        if birthtime is None or "tagged" not in entry:
+            return same_type
+        return same_type and birthtime * 10**9 <= entry["tagged"]
+
+    def __same_version(self, entry, st):
+        if entry["size"] != st.st_size:
+            return False
+        if entry["mtime"] == st.st_mtime_ns:
+            return True
+        # a coarse file system rounds mtime to whole seconds
+        rounded = entry["mtime"] % 10**9 == 0 or st.st_mtime_ns % 10**9 == 0
+        return rounded and abs(entry["mtime"] - st.st_mtime_ns) < self.MTIME_RESOLUTION_NS
+
+    def __find_copied_entry(self, abspath, st):
+        '''find key of file entry moved to abspath across file systems. moving tools keep size
+        and mtime; content is only hashed when they are ambiguous
+        '''
+        index = self.__index
+        keys = [key for key in self.__index_sizes.get(st.st_size, ())
+                if self.__same_version(index[key], st) and not os.path.exists(index[key]["path"])]
+        if len(keys) > 1 or any("hash" in index[key] for key in keys):
+            digest = self._content_hash(abspath, st)
+            keys = [key for key in keys if index[key].get("hash") == digest]
+        if len(keys) == 1:
+            return keys[0]
+        return None
+
+    def __add_entry_hash(self, key):
+        '''hash file of entry while it's still at its path'''
+        entry = self.__index[key]
+        if "hash" in entry:
+            return
+        try:
+            st = os.stat(entry["path"])
+        except OSError:
+            return
+        if self.__identity_key(st) == key and self.__same_version(entry, st):
+            self.__set_identity_entry(key, dict(entry, hash=self._content_hash(entry["path"], st)))
+
+    def __write_identity_tags(self, abspath, tags):
+        index = self.__load_index()
+        try:
+            st = os.stat(abspath)
+        except OSError:
+            return False
+        key = self.__identity_key(st)
+        entry = index.get(key)
+        if not tags:
+            return entry is None or self.__set_identity_entry(key, None)
+        new_entry = {"path": abspath, "tags": sorted(set(tags))}
+        if stat.S_ISREG(st.st_mode):
+            new_entry["size"] = st.st_size
+            new_entry["mtime"] = st.st_mtime_ns
+            collided = [k for k in self.__index_sizes.get(st.st_size, ())
+                        if k != key and self.__same_version(index[k], st)]
+            if collided:
+                # copies across file systems can't be told apart by size and mtime
+                new_entry["hash"] = self._content_hash(abspath, st)
+                for k in collided:
+                    self.__add_entry_hash(k)
+        if entry is not None:
+            if "hash" in entry and "hash" not in new_entry and self.__same_version(entry, st):
+                new_entry["hash"] = entry["hash"]
+            new_entry["tagged"] = entry.get("tagged", int(time.time() * 10**9))
+            if new_entry == entry:
+                return True
+        else:
+            new_entry["tagged"] = int(time.time() * 10**9)
+        return self.__set_identity_entry(key, new_entry)
+
 
 class DBTagger(Tagger):
     def __init__(self):
-        pass
+        super().__init__()
 
     def _load_db(self, db_path):
         pass
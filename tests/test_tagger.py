@@ -1,6 +1,7 @@
 # -*-coding: utf-8
 
 import os
+import json
 import shutil
 import unittest
 from tagger import tagger
@@ -99,6 +100,62 @@ class TaggerTestCase(unittest.TestCase):
         self.assertEqual(set(map(lambda s: os.path.abspath(s), ['tmp0/tmpf', "tmp0/tmp1"])), set(self.tagger.find_tags("tmp0", "test1", depth=1)))
         self.assertEqual(set(map(lambda s: os.path.abspath(s), ['tmp0/tmpf', "tmp0/tmp1", "tmp0/tmp1/tmp3"])), set(self.tagger.find_tags("tmp0", "test1", depth=2)))
 
+    def test_find_tags_cached(self):
+        tg = tagger.FileTagger(query_cache_size=1)
+        self.tagger.add_tags("tmp0/tmp1", "test1")
+        self.assertEqual([os.path.abspath("tmp0/tmp1")], tg.find_tags("tmp0", "test1"))
+        # tag file changed
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        self.assertEqual(set(map(os.path.abspath, ["tmp0/tmp1", "tmp0/tmpf"])),
+                         set(tg.find_tags("tmp0", "test1")))
+        # new tag file in a listed directory
+        self.tagger.add_tags("tmp0/tmp1/tmp3", "test1")
+        self.assertEqual(set(map(os.path.abspath, ["tmp0/tmp1", "tmp0/tmpf"])),
+                         set(tg.find_tags("tmp0", "test1", top_only=True)))
+        self.assertEqual(set(map(os.path.abspath, ["tmp0/tmp1", "tmp0/tmp1/tmp3", "tmp0/tmpf"])),
+                         set(tg.find_tags("tmp0", "test1")))
+        # removed path
+        shutil.rmtree("tmp0/tmp1/tmp3")
+        self.assertEqual(set(map(os.path.abspath, ["tmp0/tmp1", "tmp0/tmpf"])),
+                         set(tg.find_tags("tmp0", "test1")))
+
+    def test_find_tags_order(self):
+        with open("tmp0/tmp2/tmpg", "w+") as f:
+            f.write("test")
+        self.tagger.add_tags("tmp0", "test2", "test3")
+        self.tagger.add_tags("tmp0/tmp1", "test1")
+        self.tagger.add_tags("tmp0/tmp1/tmp3", "test1")
+        self.tagger.add_tags("tmp0/tmp2/tmpg", "test1")
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        # level by level, files of a level after its directories
+        expected = [
+            ({}, ["tmp0/tmpf", "tmp0/tmp1", "tmp0/tmp2/tmpg", "tmp0/tmp1/tmp3"]),
+            ({"top_only": True}, ["tmp0/tmpf", "tmp0/tmp1", "tmp0/tmp2/tmpg"]),
+            ({"depth": 1}, ["tmp0/tmpf", "tmp0/tmp1"]),
+        ]
+        for queue_size in (None, 1):
+            tg = tagger.FileTagger(queue_size=queue_size)
+            for kwargs, paths in expected:
+                self.assertEqual(list(map(os.path.abspath, paths)), tg.find_tags("tmp0", "test1", **kwargs))
+
+    def test_find_tags_cache_hit(self):
+        self.tagger.add_tags("tmp0/tmp1", "test1")
+        for racy_ns, walks in ((0, 0), (tagger.FileTagger.QUERY_RACY_NS, 1)):
+            tg = tagger.FileTagger(query_cache_size=1)
+            tg.QUERY_RACY_NS = racy_ns
+            paths = tg.find_tags("tmp0", "test1")
+            calls = []
+            walk = tg._possible_tagged_paths
+            tg._possible_tagged_paths = lambda *args, **kwargs: calls.append(args) or walk(*args, **kwargs)
+            self.assertEqual(paths, tg.find_tags("tmp0", "test1"))
+            # tag files just written are racily clean and walked again
+            self.assertEqual(walks, len(calls))
+
+    def test_queue_size(self):
+        for queue_size in (0, -1):
+            with self.assertRaises(ValueError):
+                tagger.FileTagger(queue_size=queue_size)
+
     def test_get_tags_dir(self):
         self.tagger.add_tags("tmp0", "test1", "test2", "test3")
         tags = self.tagger.get_tags("tmp0")
@@ -195,6 +252,152 @@ class TaggerTestCase(unittest.TestCase):
             shutil.rmtree("tmp0/tmp2/tmp1")
             shutil.rmtree("test1_dir")
 
+    def test_merge_tags_dedup(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        os.mkdir("test1_dir")
+        try:
+            shutil.copy2("tmp0/tmpf", "test1_dir/tmpg")
+            self.tagger.merge_tags("tmp0", "test1_dir", "test1", dedup=True)
+            _, _, files = next(os.walk('test1_dir'))
+            self.assertEqual(set(['tmpg']), set(files) - set([tagger.FileTagger.TAG_FILE]))
+            self.assertEqual(['test1'], self.tagger.get_tags("test1_dir/tmpg"))
+        finally:
+            shutil.rmtree("test1_dir")
+
+
+class IdentityTaggerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tagger = tagger.FileTagger(identity=True, index_path="tmp_index")
+        os.mkdir("tmp0")
+        os.mkdir("tmp0/tmp1")
+        with open("tmp0/tmpf", "w+") as f:
+            f.write("test")
+
+    def tearDown(self):
+        shutil.rmtree("tmp0")
+        if os.path.exists("tmp_index"):
+            os.remove("tmp_index")
+
+    def test_rename_file(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1", "test2")
+        os.rename("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        self.tagger.sync_tags("tmp0")
+        self.assertEqual(["test1", "test2"], self.tagger.get_tags("tmp0/tmp1/tmpg"))
+        self.assertEqual([os.path.abspath("tmp0/tmp1/tmpg")],
+                         self.tagger.find_tags("tmp0/tmp1", "test1"))
+
+    def test_find_tags_after_move(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        os.rename("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        self.tagger.sync_tags("tmp0")
+        for top_only in (False, True):
+            self.assertEqual([os.path.abspath("tmp0/tmp1/tmpg")],
+                             self.tagger.find_tags("tmp0", "test1", top_only=top_only))
+        # tags are rebound in the index only
+        self.assertFalse(os.path.exists("tmp0/tmp1/" + tagger.FileTagger.TAG_FILE))
+
+    def test_find_tags_no_hash(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        os.remove("tmp0/tmpf")
+        self.tagger.add_tags("tmp0/tmp1", "test0")
+        for name in "abcde":
+            with open("tmp0/tmp1/" + name, "w+") as f:
+                f.write("test")
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual([], tg.find_tags("tmp0", "test1"))
+        self.assertEqual({}, tg._hash_cache)
+
+    def test_malformed_index(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        with open("tmp_index", "a") as f:
+            for line in ("null", "{}", "1", "{", '{"key": "0:0", "entry": {}}',
+                         '{"key": "0:0", "entry": {"path": "/", "tags": [], "size": 1}}'):
+                f.write(line + "\n")
+        os.rename("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual(["test1"], tg.get_tags("tmp0/tmp1/tmpg"))
+        self.assertEqual([os.path.abspath("tmp0/tmp1/tmpg")], tg.find_tags("tmp0", "test1"))
+
+    def test_index_changed_by_others(self):
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index", query_cache_size=1)
+        self.assertEqual([], tg.find_tags("tmp0", "test1"))
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        os.rename("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        self.assertEqual([os.path.abspath("tmp0/tmp1/tmpg")], tg.find_tags("tmp0", "test1"))
+        # own writes don't make the index reload
+        tg.add_tags("tmp0/tmp1/tmpg", "test2")
+        self.assertEqual([os.path.abspath("tmp0/tmp1/tmpg")], tg.find_tags("tmp0", "test1", "test2"))
+
+    def test_rename_dir(self):
+        self.tagger.add_tags("tmp0/tmp1", "test1")
+        os.rename("tmp0/tmp1", "tmp0/tmp2")
+        self.assertEqual(["test1"], self.tagger.get_tags("tmp0/tmp2"))
+
+    def test_move_by_content(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        shutil.copy2("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        # a copy doesn't inherit tags while the original exists
+        self.assertEqual([], self.tagger.get_tags("tmp0/tmp1/tmpg"))
+        os.remove("tmp0/tmpf")
+        # index is persistent across instances
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual(["test1"], tg.get_tags("tmp0/tmp1/tmpg"))
+
+    def test_edit_then_rename(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        # tagging doesn't hash files
+        self.assertEqual({}, self.tagger._hash_cache)
+        with open("tmp0/tmpf", "a") as f:
+            f.write("test")
+        os.rename("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual(["test1"], tg.get_tags("tmp0/tmp1/tmpg"))
+
+    def test_reused_inode(self):
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        # atomic save gives the tagged path a new inode
+        with open("tmp0/tmpf.new", "w+") as f:
+            f.write("test")
+        os.replace("tmp0/tmpf.new", "tmp0/tmpf")
+        with open("tmp0/tmp1/tmpg", "w+") as f:
+            f.write("test")
+        self.reuse_inode("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual([], tg.get_tags("tmp0/tmp1/tmpg"))
+        # deleted file whose inode is reused by a directory
+        tg.add_tags("tmp0/tmpf", "test1")
+        os.remove("tmp0/tmpf")
+        os.mkdir("tmp0/tmp1/tmp3")
+        self.reuse_inode("tmp0/tmpf", "tmp0/tmp1/tmp3")
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual([], tg.get_tags("tmp0/tmp1/tmp3"))
+
+    def test_sync_index(self):
+        # clearing paths never tagged doesn't touch the index
+        self.tagger.clear_tags("tmp0", recursive=True)
+        self.assertFalse(os.path.exists("tmp_index"))
+        self.tagger.add_tags("tmp0/tmpf", "test1")
+        os.rename("tmp0/tmpf", "tmp0/tmp1/tmpg")
+        self.tagger.sync_tags("tmp0")
+        self.assertEqual(["test1"], self.tagger.get_tags("tmp0/tmp1/tmpg"))
+        os.rename("tmp0/tmp1/tmpg", "tmp0/tmpf")
+        self.tagger.sync_tags("tmp0", forget_moved=True)
+        tg = tagger.FileTagger(identity=True, index_path="tmp_index")
+        self.assertEqual([], tg.get_tags("tmp0/tmpf"))
+
+    def reuse_inode(self, old_path, new_path):
+        '''move index entry of old_path to the inode of new_path'''
+        index = {}
+        with open("tmp_index", "r") as f:
+            for line in f:
+                record = json.loads(line)
+                index[record["key"]] = record["entry"]
+        old_key = [key for key, entry in index.items()
+                   if entry and entry["path"] == os.path.abspath(old_path)][-1]
+        st = os.stat(new_path)
+        with open("tmp_index", "a") as f:
+            f.write(json.dumps({"key": old_key, "entry": None}) + "\n")
+            f.write(json.dumps({"key": "{}:{}".format(st.st_dev, st.st_ino), "entry": index[old_key]}) + "\n")
 
 if __name__ == "__main__":
     unittest.main()